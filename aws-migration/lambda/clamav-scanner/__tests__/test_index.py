@@ -0,0 +1,180 @@
+"""
+Tests for the ClamAV scanner's S3 range pipeline.
+
+Run from aws-migration/lambda/clamav-scanner:
+    python -m unittest discover -s __tests__
+"""
+
+import os
+import sys
+import threading
+import time
+import unittest
+from unittest import mock
+
+from botocore.exceptions import ClientError
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ.setdefault('CLAMD_PATH', '/nonexistent/clamd')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import index  # noqa: E402
+
+CHUNK = 4  # RANGE_CHUNK_SIZE used by the tests
+SLOTS = 3
+
+
+class FakeBody:
+    def __init__(self, data: bytes):
+        self.data = data
+        self.closed = False
+
+    def read(self) -> bytes:
+        return self.data
+
+    def iter_chunks(self, chunk_size: int):
+        for i in range(0, len(self.data), chunk_size):
+            yield self.data[i:i + chunk_size]
+
+    def close(self) -> None:
+        self.closed = True
+
+
+class FakeS3:
+    """Serves ranged GetObject calls for a single object."""
+
+    def __init__(self, data: bytes, etag: str = '"v1"'):
+        self.data = data
+        self.etag = etag
+        self.calls = []
+        self.bodies = []
+        self.fail_at = None
+        self.delays = {}
+
+    def get_object(self, Bucket, Key, Range, IfMatch=None):
+        start, end = (int(n) for n in Range[len('bytes='):].split('-'))
+        self.calls.append((start, IfMatch))
+        time.sleep(self.delays.get(start, 0))
+        if not self.data:
+            raise ClientError({'Error': {'Code': 'InvalidRange'}}, 'GetObject')
+        if IfMatch is not None and IfMatch != self.etag:
+            raise ClientError({'Error': {'Code': 'PreconditionFailed'}}, 'GetObject')
+        if start == self.fail_at:
+            raise ClientError({'Error': {'Code': 'InternalError'}}, 'GetObject')
+        end = min(end, len(self.data) - 1)
+        body = FakeBody(self.data[start:end + 1])
+        self.bodies.append(body)
+        return {
+            'Body': body,
+            'ContentLength': end - start + 1,
+            'ContentRange': f'bytes {start}-{end}/{len(self.data)}',
+            'ETag': self.etag,
+        }
+
+
+class IterObjectChunksTest(unittest.TestCase):
+    def setUp(self):
+        self.slots = threading.Semaphore(SLOTS)
+        for target, value in (
+            ('RANGE_CHUNK_SIZE', CHUNK),
+            ('STREAM_CHUNK_SIZE', 3),
+            ('RANGE_CONCURRENCY', 2),
+            ('RANGE_BUFFER_SLOTS', self.slots),
+        ):
+            patcher = mock.patch.object(index, target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def use_s3(self, fake: FakeS3) -> FakeS3:
+        patcher = mock.patch.object(index, 's3', fake)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return fake
+
+    def assertSlotsReturned(self):
+        self.assertEqual(self.slots._value, SLOTS)
+
+    def test_yields_ranges_in_order(self):
+        data = bytes(range(37))
+        fake = self.use_s3(FakeS3(data))
+        # Make earlier ranges finish last
+        fake.delays = {start: 0.01 * (len(data) - start) / CHUNK for start in range(CHUNK, len(data), CHUNK)}
+
+        self.assertEqual(b''.join(index.iter_object_chunks('b', 'k', len(data))), data)
+        self.assertSlotsReturned()
+        self.assertTrue(fake.bodies[0].closed)
+
+    def test_pins_later_ranges_to_first_etag(self):
+        data = bytes(range(20))
+        fake = self.use_s3(FakeS3(data))
+
+        list(index.iter_object_chunks('b', 'k', len(data)))
+        self.assertEqual(fake.calls[0], (0, None))
+        self.assertEqual(sorted(fake.calls[1:]), [(start, '"v1"') for start in range(CHUNK, 20, CHUNK)])
+
+    def test_object_overwritten_mid_scan_fails(self):
+        fake = self.use_s3(FakeS3(bytes(20)))
+        chunks = index.iter_object_chunks('b', 'k', 20)
+        next(chunks)
+        fake.etag = '"v2"'
+
+        with self.assertRaises(ClientError):
+            list(chunks)
+        self.assertSlotsReturned()
+
+    def test_length_comes_from_content_range(self):
+        data = bytes(30)
+        self.use_s3(FakeS3(data))
+
+        # An event that under-reports the size must not truncate the scan
+        with self.assertRaises(RuntimeError):
+            list(index.iter_object_chunks('b', 'k', 10))
+        self.assertEqual(len(b''.join(index.iter_object_chunks('b', 'k', 100))), 30)
+        self.assertSlotsReturned()
+
+    def test_empty_object_yields_nothing(self):
+        self.use_s3(FakeS3(b''))
+
+        self.assertEqual(list(index.iter_object_chunks('b', 'k', 0)), [])
+
+    def test_worker_error_is_raised(self):
+        fake = self.use_s3(FakeS3(bytes(40)))
+        fake.fail_at = 3 * CHUNK
+
+        with self.assertRaises(ClientError):
+            list(index.iter_object_chunks('b', 'k', 40))
+        self.assertSlotsReturned()
+
+    def test_early_close_stops_workers_and_returns_slots(self):
+        data = bytes(400)
+        fake = self.use_s3(FakeS3(data))
+        chunks = index.iter_object_chunks('b', 'k', len(data))
+        next(chunks)
+        # Let the workers fill every slot before the consumer gives up
+        time.sleep(0.1)
+        chunks.close()
+
+        self.assertSlotsReturned()
+        self.assertTrue(fake.bodies[0].closed)
+        self.assertLess(len(fake.calls), len(data) // CHUNK)
+
+    def test_concurrent_scans_share_slots(self):
+        data = bytes(range(200))
+        self.use_s3(FakeS3(data))
+        results = [None] * 4
+
+        def scan(i):
+            results[i] = b''.join(index.iter_object_chunks('b', 'k', len(data)))
+
+        threads = [threading.Thread(target=scan, args=(i,)) for i in range(len(results))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(10)
+
+        self.assertEqual(results, [data] * len(results))
+        self.assertSlotsReturned()
+
+
+if __name__ == '__main__':
+    unittest.main()
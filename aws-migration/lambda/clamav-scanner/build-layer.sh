@@ -11,6 +11,14 @@
 #   ./build-layer.sh
 #   ./build-layer.sh --publish  # Also publish to AWS
 #
+# Optional signature filtering (smaller DB = faster clamd load and scans),
+# relative paths are resolved against the current directory:
+#   CLAM_JUICE=/path/to/clam_juice.py ./build-layer.sh
+#     Filters main.cvd to the CLAM_JUICE_PROFILE subset (default: linux-only).
+#     Uploads are media and documents, so Windows PE hashes are dead weight.
+#   EXTRA_SIGNATURES="MiscreantPunch099-Low.ldb" ./build-layer.sh
+#     Space-separated signature files copied into the layer DB as-is.
+#
 
 set -e
 
@@ -19,6 +27,19 @@ REGION="${AWS_REGION:-us-east-1}"
 WORK_DIR="$(dirname "$0")"
 BUILD_DIR="$WORK_DIR/build"
 OUTPUT_DIR="$WORK_DIR/layer"
+CLAM_JUICE_PROFILE="${CLAM_JUICE_PROFILE:-linux-only}"
+
+# Resolve user-supplied paths now - the script changes directory later
+abs_path() {
+    echo "$(cd "$(dirname "$1")" && pwd)/$(basename "$1")"
+}
+if [ -n "$CLAM_JUICE" ]; then
+    CLAM_JUICE="$(abs_path "$CLAM_JUICE")"
+fi
+SIGNATURE_FILES=""
+for SIG_FILE in $SIGNATURE_FILES; do
+    SIGNATURE_FILES="$SIGNATURE_FILES $(abs_path "$SIG_FILE")"
+done
 
 echo "Building ClamAV Lambda Layer..."
 
@@ -31,14 +52,14 @@ cat > "$BUILD_DIR/Dockerfile" << 'DOCKERFILE'
 FROM public.ecr.aws/lambda/python:3.12
 
 # Install ClamAV and dependencies
-RUN dnf install -y clamav clamav-update
+RUN dnf install -y clamav clamd clamav-update
 
 # Create layer structure
-RUN mkdir -p /opt/clamav/bin /opt/clamav/lib /opt/clamav/etc /opt/clamav/share
+RUN mkdir -p /opt/clamav/bin /opt/clamav/sbin /opt/clamav/lib /opt/clamav/etc /opt/clamav/share
 
 # Copy ClamAV binaries
-RUN cp /usr/bin/clamscan /opt/clamav/bin/ && \
-    cp /usr/bin/freshclam /opt/clamav/bin/
+RUN cp /usr/bin/freshclam /opt/clamav/bin/ && \
+    cp /usr/sbin/clamd /opt/clamav/sbin/
 
 # Copy required libraries
 RUN cp -r /usr/lib64/libclam* /opt/clamav/lib/ && \
@@ -54,8 +75,11 @@ RUN mkdir -p /opt/clamav/share/clamav && \
     freshclam --datadir=/opt/clamav/share/clamav --config-file=/etc/freshclam.conf || \
     echo "Virus definitions will be downloaded at runtime"
 
+# Python dependencies (importable from /opt/python)
+RUN pip install --target /opt/python orjson
+
 # Package the layer
-RUN cd /opt && tar -czvf /clamav-layer.tar.gz clamav/
+RUN cd /opt && tar -czvf /clamav-layer.tar.gz clamav/ python/
 DOCKERFILE
 
 echo "Building Docker image..."
@@ -70,10 +94,32 @@ cd "$OUTPUT_DIR"
 tar -xzf clamav-layer.tar.gz
 rm clamav-layer.tar.gz
 
+# Paths below are relative to $OUTPUT_DIR
+DB_DIR="clamav/share/clamav"
+
+# Filter signatures down to the relevant subset
+if [ -n "$CLAM_JUICE" ]; then
+    echo "Filtering main.cvd with clam_juice ($CLAM_JUICE_PROFILE)..."
+    FILTERED_DIR="$(mktemp -d)"
+    python3 "$CLAM_JUICE" \
+        --profile "$CLAM_JUICE_PROFILE" \
+        --input "$DB_DIR/main.cvd" \
+        --output "$FILTERED_DIR"
+    rm -f "$DB_DIR/main.cvd"
+    cp "$FILTERED_DIR"/* "$DB_DIR/"
+    rm -rf "$FILTERED_DIR"
+fi
+
+# Add curated extra signatures
+for SIG_FILE in $SIGNATURE_FILES; do
+    echo "Adding signatures: $SIG_FILE"
+    cp "$SIG_FILE" "$DB_DIR/"
+done
+
 # Create Lambda layer zip
 echo "Creating Lambda layer zip..."
 cd "$OUTPUT_DIR"
-zip -r9 "$WORK_DIR/clamav-layer.zip" clamav/
+zip -r9 "$WORK_DIR/clamav-layer.zip" clamav/ python/
 
 echo "Layer built: $WORK_DIR/clamav-layer.zip"
 
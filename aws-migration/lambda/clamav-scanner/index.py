@@ -9,225 +9,752 @@ Environment Variables:
 - ALERT_TOPIC_ARN: SNS topic for security alerts
 - CLAM_DB_PATH: Path to ClamAV virus definitions (default: /opt/clamav/share/clamav)
 - MAX_FILE_SIZE_MB: Maximum file size to scan in MB (default: 500)
+- CLAMD_PATH: Path to the clamd daemon (default: /opt/clamav/sbin/clamd)
+- RANGE_CONCURRENCY: Parallel byte-range GETs per large object (default: 4)
+- SCAN_CONCURRENCY: Records scanned in parallel per batch (default: 8)
+- LOG_LEVEL: Logging level; DEBUG also logs the raw event (default: INFO)
+
+clamd is started once per execution environment at import time, so the
+signature database is loaded on cold start only and warm invocations
+scan over its UNIX socket.
 """
 
+import heapq
 import json
+import logging
 import os
+import socket
+import struct
 import subprocess
-import tempfile
-from datetime import datetime
-from typing import Any
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Callable, Iterator, Literal
+from urllib.parse import urlencode
 
 import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
 from botocore.exceptions import ClientError
 
-# Initialize AWS clients
-s3 = boto3.client('s3')
-sns = boto3.client('sns')
+try:
+    import orjson  # shipped in the layer; C serializer for events and alerts
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger()
+logger.setLevel(os.environ.get('LOG_LEVEL', 'INFO').upper())
+
+# Initialize AWS clients (shared by scan and range-fetch threads)
+# Keepalive and a large pool let the 3-5 calls per object reuse warm
+# connections; the regional S3 endpoint avoids us-east-1 global redirects.
+client_config = Config(
+    region_name=os.environ.get('AWS_REGION'),
+    retries={'mode': 'adaptive', 'max_attempts': 3},
+    max_pool_connections=64,
+    tcp_keepalive=True,
+    s3={'addressing_style': 'virtual', 'us_east_1_regional_endpoint': 'regional'},
+)
+s3 = boto3.client('s3', config=client_config)
+sns = boto3.client('sns', config=client_config)
 
 # Configuration
 QUARANTINE_BUCKET = os.environ.get('QUARANTINE_BUCKET', '')
 ALERT_TOPIC_ARN = os.environ.get('ALERT_TOPIC_ARN', '')
 CLAM_DB_PATH = os.environ.get('CLAM_DB_PATH', '/opt/clamav/share/clamav')
-CLAMSCAN_PATH = os.environ.get('CLAMSCAN_PATH', '/opt/clamav/bin/clamscan')
+CLAMD_PATH = os.environ.get('CLAMD_PATH', '/opt/clamav/sbin/clamd')
+CLAMD_CONFIG_PATH = '/tmp/clamd.conf'
+CLAMD_SOCKET = '/tmp/clamd.sock'
+CLAMD_STARTUP_TIMEOUT = 120  # seconds to wait for signatures to load
+SCAN_TIMEOUT = 300  # 5 minute timeout
+CLAMD_CHUNK_HEADER = struct.Struct('!I')  # INSTREAM chunk length prefix
 MAX_FILE_SIZE = int(os.environ.get('MAX_FILE_SIZE_MB', '500')) * 1024 * 1024
+STREAM_CHUNK_SIZE = 1024 * 1024  # 1 MB reads from the S3 body
+RANGE_CHUNK_SIZE = 8 * 1024 * 1024  # 8 MB byte-range GETs for large objects
+RANGE_CONCURRENCY = int(os.environ.get('RANGE_CONCURRENCY', '4'))
+SCAN_CONCURRENCY = int(os.environ.get('SCAN_CONCURRENCY', '8'))
+# 8 MB ranges fetched or buffered at once across all concurrent scans,
+# sized to an eighth of the function's memory
+RANGE_BUFFER_SLOTS = threading.Semaphore(max(
+    RANGE_CONCURRENCY,
+    int(os.environ.get('AWS_LAMBDA_FUNCTION_MEMORY_SIZE', '1024')) // 8 // 8,
+))
+# Headroom kept free in /tmp for clamd.conf, the socket and the files
+# clamd extracts from archives while scanning
+TMP_RESERVE = 64 * 1024 * 1024
+TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=RANGE_CHUNK_SIZE,
+    multipart_chunksize=RANGE_CHUNK_SIZE,
+    max_concurrency=RANGE_CONCURRENCY,
+    use_threads=True,
+)
 
 # File types to skip (already validated media files)
-SKIP_EXTENSIONS = {
+SKIP_EXTENSIONS = frozenset({
     '.jpg', '.jpeg', '.png', '.gif', '.webp', '.heic', '.heif', '.avif',
     '.mp4', '.mov', '.webm', '.m4v', '.avi',
     '.mp3', '.m4a', '.wav', '.aac', '.flac', '.ogg',
-}
+})
+SKIP_SUFFIXES = tuple(SKIP_EXTENSIONS)  # for a single str.endswith check
+
+# (item_id, bucket, key, size) of an object to scan
+ScanTarget = tuple[str, str, str, int]
+EventField = Literal['detail', 'Records', 's3Key', 'Event']
+
+
+def start_clamd() -> subprocess.Popen | None:
+    """Start clamd in the background so signatures load once per container."""
+    if not os.path.exists(CLAMD_PATH):
+        logger.error("clamd not available - uploads will be tagged skipped")
+        return None
+
+    max_size = f"{MAX_FILE_SIZE // (1024 * 1024)}M"
+    with open(CLAMD_CONFIG_PATH, 'w') as config:
+        config.write(
+            f"DatabaseDirectory {CLAM_DB_PATH}\n"
+            f"LocalSocket {CLAMD_SOCKET}\n"
+            "TemporaryDirectory /tmp\n"
+            "Foreground yes\n"
+            f"StreamMaxLength {max_size}\n"
+            f"MaxFileSize {max_size}\n"
+            f"MaxScanSize {max_size}\n"
+        )
+
+    # A previous clamd that died may have left its socket behind
+    if os.path.exists(CLAMD_SOCKET):
+        os.unlink(CLAMD_SOCKET)
+
+    return subprocess.Popen([CLAMD_PATH, '--foreground', f'--config-file={CLAMD_CONFIG_PATH}'])
+
+
+# Started during init; warm invocations reuse the loaded signature DB
+clamd_process = start_clamd()
+clamd_lock = threading.Lock()
+warmup_download_lock = threading.Lock()
+
+# Bytes of /tmp that concurrent scans may claim for clamd's stream spools
+# and the warm-up download. clamd answers ERROR when /tmp fills up, so
+# scans wait for space instead of overcommitting it.
+_tmp_stats = os.statvfs('/tmp')
+tmp_budget = max(0, _tmp_stats.f_bavail * _tmp_stats.f_frsize - TMP_RESERVE)
+tmp_reserved = 0
+tmp_space = threading.Condition()
+
+
+def ensure_clamd() -> None:
+    """Restart clamd if it has died (e.g. OOM) so the container stays usable."""
+    global clamd_process
+    with clamd_lock:
+        if clamd_process is not None and clamd_process.poll() is not None:
+            logger.error("clamd exited with code %s - restarting", clamd_process.returncode)
+            clamd_process = start_clamd()
 
 
 def handler(event: dict, context: Any) -> dict:
     """
     Lambda handler for virus scanning.
 
-    Triggered by EventBridge when files are uploaded to S3.
-    Scans files using ClamAV and quarantines infected ones.
+    Triggered by EventBridge, S3 notifications, an SQS queue of S3 events
+    or a direct invocation with {'bucket', 's3Key', 'size'} when files
+    are uploaded. Records in the event are scanned in parallel against
+    the same warm clamd; configure SQS sources with BatchSize 10 and
+    ReportBatchItemFailures.
 
     Args:
-        event: EventBridge or S3 event
+        event: EventBridge, S3, SQS or direct-invocation event
         context: Lambda context
 
     Returns:
-        dict with statusCode and body
+        dict with statusCode and body, plus batchItemFailures for SQS
     """
-    print(f"Event received: {json.dumps(event)}")
+    # One timestamp per invocation, shared by tags, quarantine and alerts
+    now = datetime.now(timezone.utc)
+    now_iso = now.isoformat()
+    date_prefix = now.strftime('%Y/%m/%d')
+
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Event received: %s", dumps_json(event))
+
+    from_sqs = is_sqs_event(event)
+    failures = []
+    if from_sqs:
+        # Parse each message on its own so one bad body can't fail the batch
+        targets, unparsed = parse_sqs_event(event)
+        for message_id, e in unparsed:
+            logger.error("Error parsing SQS message %s: %s", message_id, e)
+            send_alert('SCAN_ERROR', {
+                'error': str(e),
+                'messageId': message_id,
+            }, now_iso)
+            failures.append({'itemIdentifier': message_id})
+    else:
+        try:
+            # Parse event to get bucket and key of every record
+            targets = parse_event(event)
+        except Exception as e:
+            logger.error("Error parsing event: %s", e)
+            send_alert('SCAN_ERROR', {
+                'error': str(e),
+                'event': event,
+            }, now_iso)
+            raise
+
+    # Objects are independent - scan them concurrently, each thread
+    # opening its own clamd connection
+    with ThreadPoolExecutor(max_workers=max(1, min(len(targets), SCAN_CONCURRENCY))) as executor:
+        futures = [
+            executor.submit(scan_object, bucket, key, size, now_iso, date_prefix)
+            for _, bucket, key, size in targets
+        ]
 
-    try:
-        # Parse event to get bucket and key
-        bucket, key, size = parse_event(event)
-        print(f"Processing: s3://{bucket}/{key} ({size} bytes)")
-
-        # Skip large files
-        if size > MAX_FILE_SIZE:
-            print(f"File too large to scan: {size} bytes (max: {MAX_FILE_SIZE})")
-            tag_object(bucket, key, 'skipped', 'File too large')
-            return {'statusCode': 200, 'body': 'File too large - skipped'}
-
-        # Skip known safe media extensions
-        ext = os.path.splitext(key.lower())[1]
-        if ext in SKIP_EXTENSIONS:
-            print(f"Media file - tagging as scanned: {key}")
-            tag_object(bucket, key, 'clean', 'Media file - basic validation')
-            return {'statusCode': 200, 'body': 'Media file - basic validation passed'}
-
-        # Download and scan the file
-        scan_result = scan_file(bucket, key)
-
-        if scan_result['infected']:
-            # Quarantine infected file
-            handle_infected_file(bucket, key, scan_result)
-            return {'statusCode': 200, 'body': 'Infected file quarantined'}
-        else:
-            # Tag as clean
-            tag_object(bucket, key, 'clean')
-            return {'statusCode': 200, 'body': 'File scanned - clean'}
-
-    except Exception as e:
-        print(f"Error scanning file: {e}")
-        # Don't fail - just log and alert
-        send_alert('SCAN_ERROR', {
-            'error': str(e),
-            'event': event,
-        })
-        raise
+    results = []
+    error = None
+    for (item_id, bucket, key, _), future in zip(targets, futures):
+        try:
+            results.append(future.result())
+        except Exception as e:
+            logger.error("Error scanning s3://%s/%s: %s", bucket, key, e)
+            # Don't fail the rest of the batch - just log and alert
+            send_alert('SCAN_ERROR', {
+                'error': str(e),
+                'bucket': bucket,
+                'key': key,
+            }, now_iso)
+            failures.append({'itemIdentifier': item_id})
+            error = e
+
+    # Only SQS understands partial batch failures - let other sources retry
+    if error is not None and not from_sqs:
+        raise error
+
+    response = {
+        'statusCode': 200,
+        'body': '; '.join(results),
+    }
+    if from_sqs:
+        response['batchItemFailures'] = failures
+    return response
+
+
+def scan_object(bucket: str, key: str, size: int, now_iso: str, date_prefix: str) -> str:
+    """Scan one S3 object, tag or quarantine it, and describe the outcome."""
+    if not size:
+        # Size missing from the event - check it before downloading anything
+        size = s3.head_object(Bucket=bucket, Key=key)['ContentLength']
+
+    logger.info("Processing: s3://%s/%s (%d bytes)", bucket, key, size)
+
+    # Skip large files
+    if size > MAX_FILE_SIZE:
+        logger.info("File too large to scan: %d bytes (max: %d)", size, MAX_FILE_SIZE)
+        tag_object(bucket, key, 'skipped', now_iso, 'File too large')
+        return 'File too large - skipped'
+
+    # Skip known safe media extensions
+    key_lower = key.lower()
+    if key_lower.endswith(SKIP_SUFFIXES):
+        logger.info("Media file - tagging as scanned: %s", key)
+        tag_object(bucket, key, 'clean', now_iso, 'Media file - basic validation')
+        return 'Media file - basic validation passed'
+
+    # Without clamd nothing is scanned - never report such files as clean
+    if clamd_process is None:
+        logger.error("ClamAV not available - skipping scan: %s", key)
+        tag_object(bucket, key, 'skipped', now_iso, 'ClamAV not available')
+        return 'ClamAV not available - skipped'
+
+    # Stream and scan the file
+    scan_result = scan_file(bucket, key, size)
+
+    if scan_result['infected']:
+        # Quarantine infected file
+        handle_infected_file(bucket, key, size, scan_result, now_iso, date_prefix)
+        return 'Infected file quarantined'
+    else:
+        # Tag as clean
+        tag_object(bucket, key, 'clean', now_iso)
+        return 'File scanned - clean'
+
+
+def is_sqs_event(event: dict) -> bool:
+    """Check whether the event is an SQS batch."""
+    records = event.get('Records') or [{}]
+    return records[0].get('eventSource') == 'aws:sqs'
+
+
+def parse_event(event: dict, item_id: str | None = None) -> list[ScanTarget]:
+    """
+    Parse event to extract bucket, key, and size of every record.
+
+    Returns:
+        list of (item_id, bucket, key, size); item_id is the SQS messageId
+        for SQS deliveries and the object key otherwise
+    """
+    for field, parse in EVENT_PARSERS.items():
+        if field in event:
+            return parse(event, item_id)
+    raise ValueError(f"Unknown event format: {event}")
 
 
-def parse_event(event: dict) -> tuple[str, str, int]:
-    """Parse event to extract bucket, key, and size."""
-    if 'detail' in event:
-        # EventBridge S3 event
-        detail = event['detail']
-        bucket = detail['bucket']['name']
-        key = detail['object']['key']
-        size = detail['object'].get('size', 0)
-    elif 'Records' in event:
-        # Direct S3 notification
-        record = event['Records'][0]
-        bucket = record['s3']['bucket']['name']
+def parse_sqs_event(event: dict) -> tuple[list[ScanTarget], list[tuple[str, Exception]]]:
+    """
+    Parse an SQS batch whose messages wrap EventBridge or S3 events.
+
+    Returns:
+        (targets, unparsed) where unparsed lists (messageId, error) for
+        messages whose body could not be parsed
+    """
+    targets = []
+    unparsed = []
+    for record in event['Records']:
+        try:
+            targets.extend(parse_event(loads_json(record['body']), record['messageId']))
+        except (ValueError, KeyError, TypeError) as e:
+            unparsed.append((record['messageId'], e))
+    return targets, unparsed
+
+
+def parse_eventbridge_event(event: dict, item_id: str | None) -> list[ScanTarget]:
+    """Parse an EventBridge S3 'Object Created' event."""
+    detail = event['detail']
+    key = detail['object']['key']
+    return [(item_id or key, detail['bucket']['name'], key, detail['object'].get('size', 0))]
+
+
+def parse_records_event(event: dict, item_id: str | None) -> list[ScanTarget]:
+    """Parse a direct S3 notification."""
+    targets = []
+    for record in event['Records']:
         key = record['s3']['object']['key']
-        size = record['s3']['object'].get('size', 0)
-    else:
+        targets.append((
+            item_id or key,
+            record['s3']['bucket']['name'],
+            key,
+            record['s3']['object'].get('size', 0),
+        ))
+    return targets
+
+
+def parse_direct_event(event: dict, item_id: str | None) -> list[ScanTarget]:
+    """Parse a direct invocation: {'bucket': ..., 's3Key': ..., 'size': ...}."""
+    key = event['s3Key']
+    return [(item_id or key, event['bucket'], key, event.get('size', 0))]
+
+
+def parse_test_event(event: dict, item_id: str | None) -> list[ScanTarget]:
+    """Ignore the test event S3 sends once when a notification is configured."""
+    if event['Event'] != 's3:TestEvent':
         raise ValueError(f"Unknown event format: {event}")
+    return []
+
 
-    return bucket, key, size
+# Identifying field -> parser, checked in order
+EVENT_PARSERS: dict[EventField, Callable[[dict, str | None], list[ScanTarget]]] = {
+    'detail': parse_eventbridge_event,
+    'Records': parse_records_event,
+    's3Key': parse_direct_event,
+    'Event': parse_test_event,
+}
 
 
-def scan_file(bucket: str, key: str) -> dict:
+def scan_file(bucket: str, key: str, size: int) -> dict:
     """
-    Download file and scan with ClamAV.
+    Stream file from S3 into ClamAV and scan it.
+
+    The object body is streamed straight to clamd over its UNIX socket, so
+    the download and the scan overlap; clamd spools the stream into its
+    TemporaryDirectory (/tmp) while scanning. Large objects are fetched
+    as parallel byte ranges. On cold start one object is downloaded to
+    /tmp while clamd is still loading its signatures.
 
     Returns:
         dict with 'infected' (bool) and 'details' (str)
     """
-    # Download file to temp location
-    with tempfile.NamedTemporaryFile(delete=False) as tmp_file:
-        tmp_path = tmp_file.name
+    ensure_clamd()
+
+    reply = None
+    # Cold start: download while clamd is still loading signatures. Only
+    # one object at a time, and only if /tmp has room for it twice (our
+    # copy plus clamd's spool of the stream).
+    if not ping_clamd() and warmup_download_lock.acquire(blocking=False):
+        try:
+            if size and reserve_tmp_space(2 * size, blocking=False):
+                try:
+                    fd = download_to_tmpfile(bucket, key, size)
+                    try:
+                        wait_for_clamd()
+                        logger.info("Sending s3://%s/%s to clamd from /tmp...", bucket, key)
+                        reply = clamd_instream_file(fd)
+                    finally:
+                        # Unnamed file - the kernel reclaims it on close
+                        os.close(fd)
+                finally:
+                    release_tmp_space(2 * size)
+        finally:
+            warmup_download_lock.release()
+
+    if reply is None:
+        wait_for_clamd()
+        # clamd spools the whole stream to /tmp - hold its size until the reply
+        reserve_tmp_space(size)
+        try:
+            logger.info("Streaming s3://%s/%s to clamd...", bucket, key)
+            chunks = iter_object_chunks(bucket, key, size)
+            try:
+                reply = clamd_instream(chunks)
+            finally:
+                chunks.close()
+        finally:
+            release_tmp_space(size)
+
+    # clamd replies:
+    # "stream: OK"                 = No virus found
+    # "stream: <signature> FOUND"  = Virus found
+    # "<message> ERROR"            = Error
+    if reply.endswith(' OK'):
+        logger.info("File is clean")
+        return {'infected': False, 'details': 'No threats detected'}
+    elif reply.endswith(' FOUND'):
+        logger.warning("VIRUS DETECTED: %s", reply)
+        return {'infected': True, 'details': reply}
+    elif reply.endswith(' ERROR'):
+        logger.error("ClamAV error: %s", reply)
+        # Don't fail - treat as clean but log
+        return {'infected': False, 'details': f'Scan error: {reply}'}
+    else:
+        raise RuntimeError(f"Unexpected clamd reply: {reply!r}")
+
+
+def reserve_tmp_space(size: int, blocking: bool = True) -> bool:
+    """
+    Claim size bytes of the /tmp budget, waiting for other scans to release it.
 
+    Objects that could never fit raise instead of waiting. Returns False
+    if not blocking and the space is taken.
+    """
+    global tmp_reserved
+    if size > tmp_budget:
+        if not blocking:
+            return False
+        raise RuntimeError(f"{size} bytes won't fit in the {tmp_budget} byte /tmp budget")
+    with tmp_space:
+        if not blocking and tmp_reserved + size > tmp_budget:
+            return False
+        tmp_space.wait_for(lambda: tmp_reserved + size <= tmp_budget)
+        tmp_reserved += size
+        return True
+
+
+def release_tmp_space(size: int) -> None:
+    """Return bytes claimed with reserve_tmp_space() and wake waiting scans."""
+    global tmp_reserved
+    with tmp_space:
+        tmp_reserved -= size
+        tmp_space.notify_all()
+
+
+def ping_clamd() -> bool:
+    """Check whether clamd has finished loading and accepts commands."""
     try:
-        print(f"Downloading s3://{bucket}/{key} to {tmp_path}")
-        s3.download_file(bucket, key, tmp_path)
-
-        # Check if clamscan is available
-        if not os.path.exists(CLAMSCAN_PATH):
-            print("ClamAV not available - using placeholder scan")
-            return {'infected': False, 'details': 'ClamAV not available'}
-
-        # Run ClamAV scan
-        print(f"Scanning {tmp_path} with ClamAV...")
-        result = subprocess.run(
-            [
-                CLAMSCAN_PATH,
-                '--database=' + CLAM_DB_PATH,
-                '--no-summary',
-                '--infected',
-                tmp_path
-            ],
-            capture_output=True,
-            text=True,
-            timeout=300  # 5 minute timeout
-        )
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(5)
+            sock.connect(CLAMD_SOCKET)
+            sock.sendall(b'nPING\n')
+            return read_clamd_reply(sock) == 'PONG'
+    except OSError:
+        return False
+
+
+def wait_for_clamd() -> None:
+    """Block until clamd answers PING, restarting it if it has died."""
+    deadline = time.monotonic() + CLAMD_STARTUP_TIMEOUT
+    while not ping_clamd():
+        ensure_clamd()
+        if clamd_process is None:
+            raise RuntimeError("clamd not available")
+        if time.monotonic() > deadline:
+            raise RuntimeError("Timed out waiting for clamd to load signatures")
+        time.sleep(0.2)
+
+
+def clamd_instream(chunks: Iterator[bytes]) -> str:
+    """
+    Send chunks to clamd with the INSTREAM command and return its reply.
 
-        # ClamAV exit codes:
-        # 0 = No virus found
-        # 1 = Virus found
-        # 2 = Error
-        if result.returncode == 0:
-            print("File is clean")
-            return {'infected': False, 'details': 'No threats detected'}
-        elif result.returncode == 1:
-            # Virus found
-            details = result.stdout.strip() or result.stderr.strip()
-            print(f"VIRUS DETECTED: {details}")
-            return {'infected': True, 'details': details}
-        else:
-            # Error occurred
-            error = result.stderr.strip() or result.stdout.strip()
-            print(f"ClamAV error: {error}")
-            # Don't fail - treat as clean but log
-            return {'infected': False, 'details': f'Scan error: {error}'}
+    Each chunk is framed with a 4-byte big-endian length; a zero length
+    terminates the stream.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(SCAN_TIMEOUT)
+        sock.connect(CLAMD_SOCKET)
+        sock.sendall(b'nINSTREAM\n')
+        header = bytearray(CLAMD_CHUNK_HEADER.size)
+        try:
+            for chunk in chunks:
+                if chunk:
+                    CLAMD_CHUNK_HEADER.pack_into(header, 0, len(chunk))
+                    send_chunk(sock, header, chunk)
+            sock.sendall(CLAMD_CHUNK_HEADER.pack(0))
+        except (BrokenPipeError, ConnectionResetError):
+            # clamd closed the stream early (e.g. size limit) - read why
+            pass
+        return read_clamd_reply(sock)
+
+
+def clamd_instream_file(fd: int) -> str:
+    """
+    Send a downloaded file to clamd with INSTREAM and return its reply.
 
+    Chunk bodies are moved with sendfile(2), so file data goes from the
+    page cache to the socket without being copied through Python.
+    """
+    size = os.fstat(fd).st_size
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock, \
+            os.fdopen(fd, 'rb', closefd=False) as tmp_file:
+        sock.settimeout(SCAN_TIMEOUT)
+        sock.connect(CLAMD_SOCKET)
+        sock.sendall(b'nINSTREAM\n')
+        header = bytearray(CLAMD_CHUNK_HEADER.size)
+        offset = 0
+        try:
+            while offset < size:
+                count = min(size - offset, STREAM_CHUNK_SIZE)
+                CLAMD_CHUNK_HEADER.pack_into(header, 0, count)
+                sock.sendall(header)
+                sent = sock.sendfile(tmp_file, offset, count)
+                if sent < count:
+                    raise RuntimeError("Temp file shorter than expected")
+                offset += sent
+            sock.sendall(CLAMD_CHUNK_HEADER.pack(0))
+        except (BrokenPipeError, ConnectionResetError):
+            # clamd closed the stream early (e.g. size limit) - read why
+            pass
+        return read_clamd_reply(sock)
+
+
+def send_chunk(sock: socket.socket, header: bytearray, chunk: bytes) -> None:
+    """Send a framed chunk with one scatter-gather syscall, finishing partial writes."""
+    sent = sock.sendmsg((header, chunk))
+    if sent < len(header):
+        sock.sendall(header[sent:])
+        sent = len(header)
+    if sent - len(header) < len(chunk):
+        sock.sendall(memoryview(chunk)[sent - len(header):])
+
+
+def read_clamd_reply(sock: socket.socket) -> str:
+    """
+    Read a newline-terminated reply from clamd.
+
+    Raises:
+        ConnectionError: clamd closed the connection before a full reply
+    """
+    reply = b''
+    while not reply.endswith(b'\n'):
+        data = sock.recv(4096)
+        if not data:
+            raise ConnectionError("clamd closed connection without reply")
+        reply += data
+    return reply.decode(errors='replace').strip()
+
+
+def download_to_tmpfile(bucket: str, key: str, size: int) -> int:
+    """
+    Download the object into an unnamed, pre-allocated file under /tmp.
+
+    The file is opened with O_TMPFILE, so it never appears in the
+    directory and its storage is released when the returned fd is closed,
+    even if the invocation crashes.
+
+    Returns:
+        Open file descriptor for the downloaded file
+    """
+    fd = os.open('/tmp', os.O_TMPFILE | os.O_RDWR, 0o600)
+    try:
+        if size:
+            os.posix_fallocate(fd, 0, size)
+        logger.info("Downloading s3://%s/%s to /tmp", bucket, key)
+        with os.fdopen(fd, 'r+b', closefd=False) as tmp_file:
+            s3.download_fileobj(bucket, key, tmp_file, Config=TRANSFER_CONFIG)
+    except BaseException:
+        os.close(fd)
+        raise
+    return fd
+
+
+def iter_object_chunks(bucket: str, key: str, max_size: int) -> Iterator[bytes]:
+    """
+    Yield the object's bytes in order.
+
+    The first 8 MB range is streamed straight away. Its Content-Range gives
+    the object's real length and its ETag pins every later range to the
+    same version, so an overwrite mid-scan fails the scan instead of
+    mixing two objects. Objects larger than one range are fetched by
+    RANGE_CONCURRENCY workers issuing 8 MB byte-range GETs. Completed
+    ranges wait in a heap keyed by offset until the consumer reaches them.
+    Every fetched or buffered range holds one of the RANGE_BUFFER_SLOTS
+    shared by all concurrent scans, so total range memory stays bounded
+    across the whole batch.
+
+    Raises if the object is larger than max_size, the size it was
+    budgeted for.
+    """
+    try:
+        first = s3.get_object(Bucket=bucket, Key=key, Range=f'bytes=0-{RANGE_CHUNK_SIZE - 1}')
+    except ClientError as e:
+        # S3 rejects any range of an empty object
+        if e.response['Error']['Code'] == 'InvalidRange':
+            return
+        raise
+
+    body = first['Body']
+    try:
+        if 'ContentRange' in first:
+            size = int(first['ContentRange'].rsplit('/', 1)[1])
+        else:
+            size = first['ContentLength']
+        if size > max_size:
+            raise RuntimeError(f"s3://{bucket}/{key} is {size} bytes, expected at most {max_size}")
+
+        if size <= RANGE_CHUNK_SIZE:
+            yield from body.iter_chunks(STREAM_CHUNK_SIZE)
+            return
+
+        etag = first['ETag']
+        starts = iter(range(RANGE_CHUNK_SIZE, size, RANGE_CHUNK_SIZE))
+        ready = threading.Condition()
+        buffered: list[tuple[int, bytes]] = []
+        error: Exception | None = None
+        stopped = False
+
+        def acquire_slot() -> bool:
+            # Time out periodically so workers notice when the consumer stops
+            while not RANGE_BUFFER_SLOTS.acquire(timeout=0.2):
+                if stopped or error is not None:
+                    return False
+            return True
+
+        def fetch_ranges() -> None:
+            nonlocal error
+            while acquire_slot():
+                with ready:
+                    start = None if stopped or error is not None else next(starts, None)
+                if start is None:
+                    RANGE_BUFFER_SLOTS.release()
+                    return
+                try:
+                    data = fetch_range(bucket, key, start, min(start + RANGE_CHUNK_SIZE, size) - 1, etag)
+                except Exception as e:
+                    RANGE_BUFFER_SLOTS.release()
+                    with ready:
+                        error = e
+                        ready.notify()
+                    return
+                with ready:
+                    if stopped:
+                        RANGE_BUFFER_SLOTS.release()
+                        return
+                    heapq.heappush(buffered, (start, data))
+                    ready.notify()
+
+        with ThreadPoolExecutor(max_workers=RANGE_CONCURRENCY) as executor:
+            for _ in range(RANGE_CONCURRENCY):
+                executor.submit(fetch_ranges)
+            try:
+                # Later ranges download while the first one streams
+                yield from body.iter_chunks(STREAM_CHUNK_SIZE)
+                for offset in range(RANGE_CHUNK_SIZE, size, RANGE_CHUNK_SIZE):
+                    with ready:
+                        while error is None and not (buffered and buffered[0][0] == offset):
+                            ready.wait()
+                        if error is not None:
+                            raise error
+                        _, data = heapq.heappop(buffered)
+                    RANGE_BUFFER_SLOTS.release()
+                    yield data
+            finally:
+                # Hand back slots of ranges that will never be consumed
+                with ready:
+                    stopped = True
+                    for _ in buffered:
+                        RANGE_BUFFER_SLOTS.release()
+                    buffered.clear()
     finally:
-        # Clean up temp file
-        if os.path.exists(tmp_path):
-            os.unlink(tmp_path)
+        body.close()
+
+
+def fetch_range(bucket: str, key: str, start: int, end: int, etag: str) -> bytes:
+    """Fetch an inclusive byte range of an S3 object, failing if its ETag changed."""
+    response = s3.get_object(Bucket=bucket, Key=key, Range=f'bytes={start}-{end}', IfMatch=etag)
+    return response['Body'].read()
 
 
-def handle_infected_file(bucket: str, key: str, scan_result: dict) -> None:
+def handle_infected_file(
+    bucket: str, key: str, size: int, scan_result: dict, now_iso: str, date_prefix: str
+) -> None:
     """Move infected file to quarantine and send alert."""
-    quarantine_key = f"infected/{datetime.utcnow().strftime('%Y/%m/%d')}/{bucket}/{key}"
+    quarantine_key = f"infected/{date_prefix}/{bucket}/{key}"
 
-    print(f"Quarantining infected file to s3://{QUARANTINE_BUCKET}/{quarantine_key}")
+    logger.info("Quarantining infected file to s3://%s/%s", QUARANTINE_BUCKET, quarantine_key)
 
     try:
-        # Copy to quarantine with metadata
-        s3.copy_object(
-            CopySource={'Bucket': bucket, 'Key': key},
-            Bucket=QUARANTINE_BUCKET,
-            Key=quarantine_key,
-            Metadata={
+        # Copy to quarantine with metadata and scan tags in one request
+        copy_args = {
+            'Metadata': {
                 'original-bucket': bucket,
                 'original-key': key,
                 'scan-result': scan_result['details'][:256],
-                'quarantine-date': datetime.utcnow().isoformat(),
+                'quarantine-date': now_iso,
             },
-            MetadataDirective='REPLACE',
-        )
-
-        # Delete original
-        s3.delete_object(Bucket=bucket, Key=key)
-        print(f"Deleted original file from s3://{bucket}/{key}")
-
-        # Send alert
-        send_alert('MALWARE_DETECTED', {
-            'bucket': bucket,
-            'key': key,
-            'scan_result': scan_result['details'],
-            'quarantine_location': f"s3://{QUARANTINE_BUCKET}/{quarantine_key}",
-            'action': 'File quarantined and deleted from source',
-        })
+            'MetadataDirective': 'REPLACE',
+            'Tagging': urlencode({'virus-scan': 'infected', 'scan-date': now_iso}),
+            'TaggingDirective': 'REPLACE',
+        }
+        copy_source = {'Bucket': bucket, 'Key': key}
+        if size > RANGE_CHUNK_SIZE:
+            # Parallel UploadPartCopy for large files
+            s3.copy(copy_source, QUARANTINE_BUCKET, quarantine_key,
+                    ExtraArgs=copy_args, Config=TRANSFER_CONFIG)
+        else:
+            s3.copy_object(CopySource=copy_source, Bucket=QUARANTINE_BUCKET,
+                           Key=quarantine_key, **copy_args)
+
+        # Delete original while the alert is being published
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            deletion = executor.submit(s3.delete_object, Bucket=bucket, Key=key)
+
+            # Send alert - the delete outcome isn't known yet; a failed
+            # delete is reported separately as QUARANTINE_FAILED
+            send_alert('MALWARE_DETECTED', {
+                'bucket': bucket,
+                'key': key,
+                'scan_result': scan_result['details'],
+                'quarantine_location': f"s3://{QUARANTINE_BUCKET}/{quarantine_key}",
+                'action': 'File quarantined, deletion from source requested',
+            }, now_iso)
+
+            deletion.result()
+        logger.info("Deleted original file from s3://%s/%s", bucket, key)
 
     except ClientError as e:
-        print(f"Error quarantining file: {e}")
+        logger.error("Error quarantining file: %s", e)
         # Still send alert even if quarantine fails
         send_alert('QUARANTINE_FAILED', {
             'bucket': bucket,
             'key': key,
             'scan_result': scan_result['details'],
             'error': str(e),
-        })
+        }, now_iso)
         raise
 
 
-def tag_object(bucket: str, key: str, status: str, details: str = '') -> None:
+def tag_object(bucket: str, key: str, status: str, scan_date: str, details: str = '') -> None:
     """Tag S3 object with scan result."""
     try:
         tags = [
             {'Key': 'virus-scan', 'Value': status},
-            {'Key': 'scan-date', 'Value': datetime.utcnow().isoformat()},
+            {'Key': 'scan-date', 'Value': scan_date},
         ]
         if details:
             tags.append({'Key': 'scan-details', 'Value': details[:256]})
@@ -238,27 +765,41 @@ def tag_object(bucket: str, key: str, status: str, details: str = '') -> None:
             Tagging={'TagSet': tags}
         )
     except ClientError as e:
-        print(f"Failed to tag object: {e}")
+        logger.warning("Failed to tag object: %s", e)
 
 
-def send_alert(alert_type: str, data: dict) -> None:
+def send_alert(alert_type: str, data: dict, timestamp: str) -> None:
     """Send alert to SNS topic."""
     if not ALERT_TOPIC_ARN:
-        print(f"Alert (no SNS): {alert_type} - {data}")
+        logger.warning("Alert (no SNS): %s - %s", alert_type, data)
         return
 
     try:
         message = {
             'type': alert_type,
-            'timestamp': datetime.utcnow().isoformat(),
+            'timestamp': timestamp,
             **data,
         }
 
         sns.publish(
             TopicArn=ALERT_TOPIC_ARN,
             Subject=f"[SECURITY ALERT] {alert_type}",
-            Message=json.dumps(message, indent=2),
+            Message=dumps_json(message),
         )
-        print(f"Alert sent: {alert_type}")
+        logger.info("Alert sent: %s", alert_type)
     except ClientError as e:
-        print(f"Failed to send alert: {e}")
+        logger.error("Failed to send alert: %s", e)
+
+
+def dumps_json(obj: Any) -> str:
+    """Serialize to compact JSON with orjson when available."""
+    if orjson is not None:
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj, separators=(',', ':'))
+
+
+def loads_json(data: str | bytes) -> Any:
+    """Parse JSON with orjson when available."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)